@@ -5,23 +5,165 @@
 # Define useful functions to manage measurement data in a relational database
 # 
 
+import sqlite3
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+# SQL text that runs for every measurement is kept in constants so the
+# statement caches see exactly the same string on every call.
+_INSERT_MEAS_SQL = """INSERT INTO measurement (timestamp, sensor, value)
+    VALUES (?, ?, ?);"""
+# A duplicate name becomes a no-op update so that RETURNING gives back the id
+# of the new or the existing row in one statement (SQLite 3.35 or later).
+_UPSERT_UNITS_SQL = """INSERT INTO units (name) VALUES (?)
+    ON CONFLICT(name) DO UPDATE SET name = excluded.name
+    RETURNING id;"""
+_UPSERT_TYPE_SQL = """INSERT INTO type (name, units) VALUES (?, ?)
+    ON CONFLICT(name) DO UPDATE SET name = excluded.name
+    RETURNING id;"""
+_UPSERT_SENSOR_SQL = """INSERT INTO sensor (name, type) VALUES (?, ?)
+    ON CONFLICT(name) DO UPDATE SET name = excluded.name
+    RETURNING id;"""
+
+# PostgreSQL: parse and plan the insert once per session, then EXECUTE it
+_PG_PREPARE_MEAS_SQL = """PREPARE ins_meas AS
+    INSERT INTO measurement (timestamp, sensor, value) VALUES ($1, $2, $3);"""
+_PG_EXECUTE_MEAS_SQL = "EXECUTE ins_meas (%s, %s, %s);"
+# SQLSTATE invalid_sql_statement_name: this session has not prepared ins_meas
+_PG_UNDEFINED_STATEMENT = "26000"
+# PostgreSQL batch inserts: many rows per statement, or a COPY stream
+_PG_INSERT_MEAS_VALUES_SQL = """INSERT INTO measurement (timestamp, sensor, value)
+    VALUES %s;"""
+_PG_COPY_MEAS_SQL = """COPY measurement (timestamp, sensor, value)
+    FROM STDIN WITH (FORMAT text);"""
+_PG_COPY_MEAS_BINARY_SQL = """COPY measurement (timestamp, sensor, value)
+    FROM STDIN WITH (FORMAT binary);"""
+# PostgreSQL binary COPY stream for columns timestamp text, sensor integer and
+# value real: signature, flags and header extension length, then per row the
+# field count and each field as a length followed by the raw value in network
+# byte order, and a field count of -1 to end the stream.
+_PG_COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+_PG_COPY_TRAILER = struct.pack("!h", -1)
+_PG_COPY_ROW_HEAD = struct.Struct("!hi")    # 3 fields, time stamp length
+_PG_COPY_ROW_TAIL = struct.Struct("!iiif")  # int4 sensor, float4 value
+# PostgreSQL: DO UPDATE (rather than DO NOTHING) makes RETURNING produce the id
+# even when the name already exists, saving a SELECT round trip.
+_PG_UPSERT_UNITS_SQL = """INSERT INTO units (name) VALUES (%s)
+    ON CONFLICT ON CONSTRAINT units_name_key DO UPDATE SET name = EXCLUDED.name
+    RETURNING id;"""
+_PG_UPSERT_TYPE_SQL = """INSERT INTO type (name, units) VALUES (%s, %s)
+    ON CONFLICT ON CONSTRAINT type_name_key DO UPDATE SET name = EXCLUDED.name
+    RETURNING id;"""
+_PG_UPSERT_SENSOR_SQL = """INSERT INTO sensor (name, type) VALUES (%s, %s)
+    ON CONFLICT ON CONSTRAINT sensor_name_key DO UPDATE SET name = EXCLUDED.name
+    RETURNING id;"""
+# PostgreSQL batch registration: insert the new names, then look up their ids
+_PG_INSERT_UNITS_SQL = """INSERT INTO units (name) VALUES (%s)
+    ON CONFLICT ON CONSTRAINT units_name_key DO NOTHING;"""
+_PG_INSERT_TYPE_SQL = """INSERT INTO type (name, units) VALUES (%s, %s)
+    ON CONFLICT ON CONSTRAINT type_name_key DO NOTHING;"""
+_PG_INSERT_SENSOR_SQL = """INSERT INTO sensor (name, type) VALUES (%s, %s)
+    ON CONFLICT ON CONSTRAINT sensor_name_key DO NOTHING;"""
+_PG_SELECT_UNITS_IDS_SQL = "SELECT name, id FROM units WHERE name = ANY(%s);"
+_PG_SELECT_TYPE_IDS_SQL = "SELECT name, id FROM type WHERE name = ANY(%s);"
+_PG_SELECT_SENSOR_IDS_SQL = "SELECT name, id FROM sensor WHERE name = ANY(%s);"
+
+# The SQLite measurement table stores time stamps as integer microseconds
+# since the Unix epoch (UTC).
+_EPOCH = datetime(1970, 1, 1)
+_ONE_MICROSECOND = timedelta(microseconds=1)
+
+
+def _measurement_rows(meas_iter, sensors, epoch=False):
+    """Generate (time stamp, sensor row id, value) tuples for measurements.
+
+    sensors maps sensor names to row ids. With epoch=True the time stamp is
+    integer microseconds since the epoch, otherwise an ISO 8601 string.
+    KeyError names a sensor that was never registered; callers write the
+    rows inside a transaction, so nothing of the batch is kept.
+    """
+    # Local names avoid global lookups inside the loops
+    epoch_start = _EPOCH
+    one_microsecond = _ONE_MICROSECOND
+    if epoch:
+        for m in meas_iter:
+            yield ((m.get_time() - epoch_start) // one_microsecond,
+                   sensors[m.get_id()], m.get_data())
+    else:
+        for m in meas_iter:
+            yield (m.get_timestamp(), sensors[m.get_id()], m.get_data())
+
+
+def _pg_copy_binary(rows):
+    """Return the PostgreSQL binary COPY stream for measurement rows.
+
+    rows are (time stamp string, sensor row id, value) tuples, written for
+    columns of type text, integer and real.
+    """
+    parts = [_PG_COPY_HEADER]
+    append = parts.append
+    pack_head = _PG_COPY_ROW_HEAD.pack
+    pack_tail = _PG_COPY_ROW_TAIL.pack
+    for stamp, sensor_id, value in rows:
+        stamp = stamp.encode()
+        append(pack_head(3, len(stamp)))
+        append(stamp)
+        append(pack_tail(4, sensor_id, 4, value))
+    append(_PG_COPY_TRAILER)
+    return b"".join(parts)
+
+
+# PostgreSQL connection pools, one per DSN, shared by every PostgreSQLConnector
+# so that a new connector does not pay for a new server connection and login.
+_pg_pools = {}
+_pg_pools_lock = threading.Lock()
+
+
+def _get_pg_pool(dsn, minconn=1, maxconn=8):
+    """Return the connection pool for dsn, creating it on first use."""
+    import psycopg2.pool
+
+    with _pg_pools_lock:
+        pool = _pg_pools.get(dsn)
+        if pool is None:
+            pool = psycopg2.pool.ThreadedConnectionPool(minconn, maxconn, dsn)
+            _pg_pools[dsn] = pool
+    return pool
+
 
 class DatabaseConnector(object):
     """Manage creating measurement, sensor, type and units records in SQLite DB. 
     """
-    def __init__(self, database):
+    def __init__(self, database, batch_size=1000, max_age=10.0):
         """Initialize the sqlite database and prepare to store measurements.
         
         This is for testing therefore the database is created new.
+        Measurements passed to store_measurement() are buffered and written
+        batch_size at a time, or once the oldest has waited max_age seconds;
+        call flush() to write out the remainder.
         """
-        import sqlite3
-
         self._connection = self._create_database(database)
+        # One cursor is reused for every statement. Like the connection it
+        # must only be used from one thread at a time.
+        self._curs = self._connection.cursor()
 
         # Initialize dictionaries to remember units, types and sensors
         self._units = {}
         self._types = {}
         self._sensors = {}
+        # (dictionary, name) entries added by the open transaction; they are
+        # removed again if it rolls back, since the row ids no longer exist
+        self._uncommitted = []
+
+        # Measurements waiting to be written in one transaction
+        self._pending = []
+        self._batch_size = batch_size
+        self._max_age = max_age
+        # time.monotonic() when the oldest waiting measurement was queued
+        self._pending_since = None
         return
 
     def _create_database(self, filename):
@@ -37,78 +179,176 @@ class DatabaseConnector(object):
         is optional in SQL but was added by the SQLite browser. The quote marks
         were copied along with the SQL statements generated by the browser 
         application. 
+
+        The connection is switched to write-ahead logging (WAL): commits only
+        append to the -wal file instead of rewriting a rollback journal, and
+        other processes (e.g. a dashboard) can keep reading the database
+        while measurements are being written.
+        The connection does not open transactions implicitly
+        (isolation_level=None); writes are grouped with _transaction().
         """
 
         # open the file, file will be created if it doesn't already exist
-        conn = sqlite3.Connection(filename)
+        conn = sqlite3.Connection(filename, isolation_level=None,
+                                  cached_statements=256)
+        # Tune the connection for measurement ingest.
+        # synchronous=NORMAL is safe with WAL: a power loss can only lose the
+        # last transactions, never corrupt the file.
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-64000")  # negative means KiB, ~64 MB
+        conn.execute("PRAGMA mmap_size=268435456")  # 256 MB
         # Get a cursor
         curs = conn.cursor()
-        
-        # Measurement table
-        sql = """
-        DROP TABLE IF EXISTS measurement;
-        CREATE TABLE measurement (
-        timestamp	TEXT NOT NULL,
-        sensor	INTEGER NOT NULL,
-        value	REAL NOT NULL,
-        PRIMARY KEY(timestamp,sensor),
-        FOREIGN KEY(sensor) REFERENCES sensor(id)
-        );"""
-        curs.executescript(sql)
 
-        # Sensor table
+        # The whole schema is rebuilt in one script and one transaction, so
+        # an interrupted start-up never leaves half the tables behind.
+        # Tables are dropped before the tables they refer to, and created
+        # after them: units, type, sensor, measurement.
         sql = """
+        BEGIN;
+        DROP TABLE IF EXISTS measurement;
         DROP TABLE IF EXISTS sensor;
-        CREATE TABLE sensor (
+        DROP TABLE IF EXISTS type;
+        DROP TABLE IF EXISTS units;
+
+        -- Units table
+        CREATE TABLE units (
         id	INTEGER,
         name	TEXT NOT NULL UNIQUE,
-        type	INTEGER NOT NULL,
-        PRIMARY KEY(id),
-        FOREIGN KEY(type) REFERENCES type(id)
-        );"""
-        curs.executescript(sql)
+        PRIMARY KEY(id)
+        );
 
-        # Type table
-        sql ="""
-        DROP TABLE IF EXISTS type;
+        -- Type table
         CREATE TABLE type (
         id	INTEGER,
         name	TEXT NOT NULL UNIQUE,
         units	INTEGER,
         PRIMARY KEY(id),
         FOREIGN KEY(units) REFERENCES units(id)
-        );"""
-        curs.executescript(sql)
+        );
 
-        # Units table
-        sql = """
-        DROP TABLE IF EXISTS units;
-        CREATE TABLE units (
+        -- Sensor table
+        CREATE TABLE sensor (
         id	INTEGER,
         name	TEXT NOT NULL UNIQUE,
-        PRIMARY KEY(id)
-        );"""
-        curs.executescript(sql)
+        type	INTEGER NOT NULL,
+        PRIMARY KEY(id),
+        FOREIGN KEY(type) REFERENCES type(id)
+        );
 
-        # Write the changes to the database file
-        conn.commit()
+        -- Measurement table
+        -- timestamp is microseconds since the epoch. The table is stored in
+        -- (sensor, timestamp) order, so each new measurement is appended at
+        -- the end of its sensor's rows instead of going into a random page.
+        CREATE TABLE measurement (
+        timestamp	INTEGER NOT NULL,
+        sensor	INTEGER NOT NULL,
+        value	REAL NOT NULL,
+        PRIMARY KEY(sensor,timestamp),
+        FOREIGN KEY(sensor) REFERENCES sensor(id)
+        ) WITHOUT ROWID;
+        COMMIT;"""
+        curs.executescript(sql)
         return conn
 
     def store_measurement(self, meas):
-        """Create a new record in the measurement table for this measurement.
+        """Queue a new record in the measurement table for this measurement.
 
         meas is a Measurement instance.
+        The record is written when batch_size measurements are waiting, when
+        the oldest has waited max_age seconds or when flush() is called.
+        A measurement from a sensor that was never registered is rejected
+        with KeyError, and one without a value with ValueError, here rather
+        than when the whole batch is written.
         """
-        curs = self._connection.cursor()
-        
-        # Get the row ID for this sensor; get_id() returns a name string
-        name_id = self._sensors[meas.get_id()]
-        # Insert the new record
-        curs.execute("""INSERT INTO measurement (timestamp, sensor, value)
-            VALUES (?, ?, ?);""", (meas.get_timestamp(), name_id, meas.get_data()))
-        self._connection.commit()
+        if meas.get_id() not in self._sensors:
+            raise KeyError("sensor not registered: {}".format(meas.get_id()))
+        if meas.get_data() is None:
+            raise ValueError("no value for sensor: {}".format(meas.get_id()))
+        now = time.monotonic()
+        if not self._pending:
+            self._pending_since = now
+        self._pending.append(meas)
+        if (len(self._pending) >= self._batch_size
+                or now - self._pending_since >= self._max_age):
+            self.flush()
         return
-        
+
+    def store_measurements(self, meas_iter):
+        """Create records in the measurement table for many measurements.
+
+        meas_iter is an iterable of Measurement instances. All the records
+        are inserted with a single executemany() in one transaction, so the
+        database file is only synced once for the whole batch.
+        """
+        # get_id() returns a name string, look up the sensor row ID for it
+        rows = _measurement_rows(meas_iter, self._sensors, epoch=True)
+        with self._transaction():
+            self._curs.executemany(_INSERT_MEAS_SQL, rows)
+        return
+
+    def flush(self):
+        """Write any measurements still waiting in the buffer.
+
+        If the database is busy or locked the measurements stay in the
+        buffer and are written by the next successful flush(). Any other
+        error means the batch itself is bad, e.g. a duplicate time stamp for
+        a sensor, so it is dropped and the error is raised to report it;
+        otherwise every later flush() would fail the same way.
+        """
+        if self._pending:
+            try:
+                self.store_measurements(self._pending)
+            except sqlite3.OperationalError:
+                raise
+            except sqlite3.Error:
+                self._pending = []
+                raise
+            self._pending = []
+        return
+
+    def close(self):
+        """Write any buffered measurements and close the database.
+
+        The connection is closed even if the final flush() fails.
+        """
+        try:
+            self.flush()
+        finally:
+            self._curs.close()
+            self._connection.close()
+        return
+
+    @contextmanager
+    def _transaction(self):
+        """Run the statements in the with block as one write transaction.
+
+        BEGIN IMMEDIATE takes the write lock up front, so the batch cannot
+        fail half way with a busy database; readers are not blocked in WAL
+        mode. Commits on success and rolls back on an exception, including
+        a failed COMMIT; ids remembered inside the transaction are then
+        forgotten, for register_sensor() as well as warmup().
+        """
+        self._curs.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+            self._curs.execute("COMMIT")
+        except BaseException:
+            # A failed COMMIT may already have ended the transaction
+            if self._connection.in_transaction:
+                self._curs.execute("ROLLBACK")
+            self._forget_uncommitted()
+            raise
+        del self._uncommitted[:]
+
+    def _forget_uncommitted(self):
+        """Remove the ids remembered during a transaction that rolled back."""
+        for id_dict, name in self._uncommitted:
+            id_dict.pop(name, None)
+        del self._uncommitted[:]
+
 
     def register_sensor(self, sensor):
         """Create DB records for units, type and sensor name for this sensor.
@@ -119,40 +359,62 @@ class DatabaseConnector(object):
         The order is units, type, name. After that, measurements can be entered
         into the measurement table with a single insert.
         The DatabaseConnector remembers the row ids to create new records quickly.
+        A sensor that was already registered is skipped without any SQL.
+        """
+        if sensor.get_name() in self._sensors:
+            return
+        with self._transaction():
+            self._register_sensor(sensor)
+        return
+
+    def warmup(self, sensors):
+        """Register all the sensors of the system up front in one transaction.
+
+        Call this before the measurement loop; after that, storing a
+        measurement only looks up the sensor row id in a dictionary.
         """
-        def insert_and_recall_id(items, table, cols, id_dict):
-            """Nested function: Insert items into table at cols and return ID."""
-            if len(items) == 2 and len(cols) == 2:
-                sql = """INSERT OR IGNORE INTO {} ({}, {}) 
-                    VALUES (?,?)""".format(table, cols[0],cols[1])
-                curs.execute(sql, items)
-            else:
-                sql = "INSERT OR IGNORE INTO {} ({}) VALUES (?)".format(table, cols[0])
-                curs.execute(sql, items)
-            # what is the ID corresponding to the items just entered?
-            sql = "SELECT id FROM {} WHERE name = ?".format(table)
-            curs.execute(sql, (items[0],))
-            item_id = curs.fetchone()[0]  # Fetch the first row and get element [0]
-            # Remember this id
-            if items[0] not in id_dict:
-                id_dict[items[0]] = item_id
-            return item_id
-
-        curs = self._connection.cursor()
-
-        # Use the nested function for the units, type and name 
+        with self._transaction():
+            for sensor in sensors:
+                self._register_sensor(sensor)
+        return
+
+    def _register_sensor(self, sensor):
+        """Insert the units, type and sensor rows for sensor, without commit."""
+        if sensor.get_name() in self._sensors:
+            return
+
         # Units name into units table
-        units_id = insert_and_recall_id((sensor.get_units(),), "units", ("name",), self._units)
+        units_id = self._upsert_units(sensor.get_units())
         # Type name and units into type table
-        type_id = insert_and_recall_id((sensor.get_type(), units_id),\
-            "type", ("name","units"), self._types)
+        type_id = self._upsert_type(sensor.get_type(), units_id)
         # Sensor name and type into sensor table
-        sensor_id = insert_and_recall_id((sensor.get_name(), type_id),\
-            "sensor", ("name","type"), self._sensors)
-
-        self._connection.commit() # commit the transaction
+        self._upsert_sensor(sensor.get_name(), type_id)
         return
 
+    def _upsert_units(self, name):
+        """Return the units row id for name, inserting the row if needed."""
+        if name not in self._units:
+            self._curs.execute(_UPSERT_UNITS_SQL, (name,))
+            self._units[name] = self._curs.fetchone()[0]
+            self._uncommitted.append((self._units, name))
+        return self._units[name]
+
+    def _upsert_type(self, name, units_id):
+        """Return the type row id for name, inserting the row if needed."""
+        if name not in self._types:
+            self._curs.execute(_UPSERT_TYPE_SQL, (name, units_id))
+            self._types[name] = self._curs.fetchone()[0]
+            self._uncommitted.append((self._types, name))
+        return self._types[name]
+
+    def _upsert_sensor(self, name, type_id):
+        """Return the sensor row id for name, inserting the row if needed."""
+        if name not in self._sensors:
+            self._curs.execute(_UPSERT_SENSOR_SQL, (name, type_id))
+            self._sensors[name] = self._curs.fetchone()[0]
+            self._uncommitted.append((self._sensors, name))
+        return self._sensors[name]
+
 
 
 class PostgreSQLConnector(object):
@@ -160,16 +422,22 @@ class PostgreSQLConnector(object):
     """
     def __init__(self, dbname, host, user, password):
         """Initialize the PostgreSQL database connection.
+
+        Connections come from a pool shared by all connectors using the same
+        database. Each operation borrows one and always gives it back, so
+        a connector does not hold a connection between calls.
         """
-        import psycopg2
         #postgresql://[user[:password]@][netloc][:port][/dbname][?param1=value1&...]
         #https://www.postgresql.org/docs/current/static/libpq-connect.html#LIBPQ-CONNSTRING
         dsn = "postgresql://{}:{}@{}/{}".format(user, password, host, dbname)
-        self._connection = psycopg2.connect(dsn)
+        self._pool = _get_pg_pool(dsn)
         # Initialize dictionaries to remember units, types and sensors
         self._units = {}
         self._types = {}
         self._sensors = {}
+        # (dictionary, name) entries added since the last commit; they are
+        # removed again if the transaction rolls back
+        self._uncommitted = []
         return
 #
     def store_measurement(self, meas):
@@ -177,14 +445,106 @@ class PostgreSQLConnector(object):
 
         meas is a Measurement instance.
         """
-        curs = self._connection.cursor()
-        
+        import psycopg2
+
         # Get the row ID for this sensor; get_id() returns a name string
         name_id = self._sensors[meas.get_id()]
-        # Insert the new record
-        curs.execute("""INSERT INTO measurement (timestamp, sensor, value)
-            VALUES (%s, %s, %s);""", (meas.get_timestamp(), name_id, meas.get_data()))
-        self._connection.commit()
+        row = (meas.get_timestamp(), name_id, meas.get_data())
+        with self._cursor() as curs:
+            try:
+                curs.execute(_PG_EXECUTE_MEAS_SQL, row)
+            except psycopg2.Error as err:
+                if err.pgcode != _PG_UNDEFINED_STATEMENT:
+                    raise
+                # First insert on this pooled connection: prepare the
+                # statement, which then lasts as long as the session
+                curs.connection.rollback()
+                curs.execute(_PG_PREPARE_MEAS_SQL)
+                curs.execute(_PG_EXECUTE_MEAS_SQL, row)
+        return
+
+    def close(self):
+        """Nothing to release; kept so both connectors have the same methods.
+
+        Connections go back to the pool at the end of every operation.
+        """
+        return
+
+    @contextmanager
+    def _cursor(self):
+        """Borrow a pooled connection and yield a cursor for one transaction.
+
+        Commits on success. After an error the ids remembered during the
+        transaction are forgotten and the connection is rolled back. The
+        connection is given back to the pool either way; a broken one is
+        closed so the pool opens a new one.
+        """
+        conn = self._pool.getconn()
+        try:
+            with conn.cursor() as curs:
+                yield curs
+            conn.commit()
+        except BaseException:
+            self._forget_uncommitted()
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            self._pool.putconn(conn, close=bool(conn.closed))
+        del self._uncommitted[:]
+
+    def _forget_uncommitted(self):
+        """Remove the ids remembered during a transaction that rolled back."""
+        for id_dict, name in self._uncommitted:
+            id_dict.pop(name, None)
+        del self._uncommitted[:]
+
+    def store_measurements(self, meas_iter, page_size=1000):
+        """Create records in the measurement table for many measurements.
+
+        meas_iter is an iterable of Measurement instances. Rows are sent
+        page_size at a time as multi-row INSERT statements and committed once.
+        """
+        from psycopg2.extras import execute_values
+
+        rows = _measurement_rows(meas_iter, self._sensors, epoch=False)
+        with self._cursor() as curs:
+            execute_values(curs, _PG_INSERT_MEAS_VALUES_SQL, rows,
+                           page_size=page_size)
+        return
+
+    def store_measurements_bulk(self, meas_iter, binary=False):
+        """Load many measurements into the measurement table with COPY.
+
+        meas_iter is an iterable of Measurement instances. COPY avoids the
+        per-statement parse and plan of INSERT and is the fastest way to load
+        thousands of rows at once. The whole batch is committed once.
+        By default the rows are sent as text, which the server converts to
+        whatever the column types are. binary=True sends the sensor ids and
+        values as raw int4 and float4, which the server does not have to
+        parse, but only works when the columns are exactly text, integer and
+        real; any other type fails with "incorrect binary data format".
+        """
+        from io import BytesIO, StringIO
+
+        rows = _measurement_rows(meas_iter, self._sensors, epoch=False)
+        if binary:
+            buf = BytesIO(_pg_copy_binary(rows))
+            sql = _PG_COPY_MEAS_BINARY_SQL
+        else:
+            buf = StringIO()
+            write = buf.write
+            for stamp, sensor_id, value in rows:
+                # COPY text format: tab separated columns, one row per line,
+                # \N for NULL. str() rather than repr() so that Decimal and
+                # NumPy values are written as plain numbers.
+                if value is None:
+                    value = "\\N"
+                write("{}\t{}\t{}\n".format(stamp, sensor_id, value))
+            sql = _PG_COPY_MEAS_SQL
+        buf.seek(0)
+        with self._cursor() as curs:
+            curs.copy_expert(sql, buf)
         return
 
     def register_sensor(self, sensor):
@@ -196,41 +556,106 @@ class PostgreSQLConnector(object):
         The order is units, type, name. After that, measurements can be entered
         into the measurement table with a single insert.
         The DatabaseConnector remembers the row ids to create new records quickly.
+        A sensor that was already registered is skipped without any SQL.
         """
-        def insert_and_recall_id(items, table, cols, constraint, id_dict):
-            """Nested function: Insert items into table at cols and return ID."""
-            if len(items) == 2 and len(cols) == 2:
-                sql = """INSERT INTO {} ({}, {}) 
-                    VALUES (%s,%s)
-                    ON CONFLICT ON CONSTRAINT {} DO NOTHING;
-                    """.format(table, cols[0],cols[1], constraint)
-                curs.execute(sql, items)
-            else:
-                sql = """INSERT INTO {} ({}) VALUES (%s)
-                    ON CONFLICT ON CONSTRAINT {} DO NOTHING;
-                    """.format(table, cols[0], constraint)
-                curs.execute(sql, items)
-            # what is the ID corresponding to the items just entered?
-            sql = "SELECT id FROM {} WHERE name = %s".format(table)
-            curs.execute(sql, (items[0],))
-            item_id = curs.fetchone()[0]  # Fetch the first row and get element [0]
-            # Remember this id
-            if items[0] not in id_dict:
-                id_dict[items[0]] = item_id
-            return item_id
-
-        curs = self._connection.cursor()
-
-        # Use the nested function for the units, type and name 
-        # Units name into units table
-        units_id = insert_and_recall_id((sensor.get_units(),), "units", ("name",), "units_name_key", self._units)
-        # Type name and units into type table
-        type_id = insert_and_recall_id((sensor.get_type(), units_id),\
-            "type", ("name","units"), "type_name_key", self._types)
-        # Sensor name and type into sensor table
-        sensor_id = insert_and_recall_id((sensor.get_name(), type_id),\
-            "sensor", ("name","type"), "sensor_name_key", self._sensors)
+        if sensor.get_name() in self._sensors:
+            return
 
-        self._connection.commit() # commit the transaction
+        with self._cursor() as curs:
+            # Units name into units table
+            units_id = self._upsert_units(curs, sensor.get_units())
+            # Type name and units into type table
+            type_id = self._upsert_type(curs, sensor.get_type(), units_id)
+            # Sensor name and type into sensor table
+            self._upsert_sensor(curs, sensor.get_name(), type_id)
         return
 
+    def _upsert_units(self, curs, name):
+        """Return the units row id for name, inserting the row if needed."""
+        if name not in self._units:
+            curs.execute(_PG_UPSERT_UNITS_SQL, (name,))
+            self._units[name] = curs.fetchone()[0]
+            self._uncommitted.append((self._units, name))
+        return self._units[name]
+
+    def _upsert_type(self, curs, name, units_id):
+        """Return the type row id for name, inserting the row if needed."""
+        if name not in self._types:
+            curs.execute(_PG_UPSERT_TYPE_SQL, (name, units_id))
+            self._types[name] = curs.fetchone()[0]
+            self._uncommitted.append((self._types, name))
+        return self._types[name]
+
+    def _upsert_sensor(self, curs, name, type_id):
+        """Return the sensor row id for name, inserting the row if needed."""
+        if name not in self._sensors:
+            curs.execute(_PG_UPSERT_SENSOR_SQL, (name, type_id))
+            self._sensors[name] = curs.fetchone()[0]
+            self._uncommitted.append((self._sensors, name))
+        return self._sensors[name]
+
+    def register_sensors(self, sensors, page_size=100):
+        """Create DB records for units, type and sensor name for many sensors.
+
+        Same result as calling register_sensor() for each sensor, for use when
+        the whole system is set up at once. The new rows of each table are
+        sent with execute_batch(), page_size statements per round trip, and
+        their ids are read back with one SELECT per table.
+        """
+        new_sensors = [s for s in sensors if s.get_name() not in self._sensors]
+        if not new_sensors:
+            return
+
+        # Same order as register_sensor(): units, type, name.
+        # The dictionaries remove duplicate names before anything is sent.
+        # On failure nothing is kept, in the database or in the dictionaries.
+        with self._cursor() as curs:
+            self._insert_and_recall_ids(
+                curs,
+                list({s.get_units(): (s.get_units(),)
+                      for s in new_sensors}.values()),
+                _PG_INSERT_UNITS_SQL, _PG_SELECT_UNITS_IDS_SQL, self._units,
+                page_size)
+            self._insert_and_recall_ids(
+                curs,
+                list({s.get_type(): (s.get_type(), self._units[s.get_units()])
+                      for s in new_sensors}.values()),
+                _PG_INSERT_TYPE_SQL, _PG_SELECT_TYPE_IDS_SQL, self._types,
+                page_size)
+            self._insert_and_recall_ids(
+                curs,
+                list({s.get_name(): (s.get_name(), self._types[s.get_type()])
+                      for s in new_sensors}.values()),
+                _PG_INSERT_SENSOR_SQL, _PG_SELECT_SENSOR_IDS_SQL, self._sensors,
+                page_size)
+        return
+
+    def _insert_and_recall_ids(self, curs, rows, insert_sql, select_sql,
+                               id_dict, page_size):
+        """Insert rows with insert_sql and remember the IDs of their names.
+
+        The first element of each row is the name; select_sql looks up the
+        (name, id) pairs for a list of names.
+        """
+        from psycopg2.extras import execute_batch
+
+        # Leave out names that are already known
+        rows = [r for r in rows if r[0] not in id_dict]
+        if not rows:
+            return
+        execute_batch(curs, insert_sql, rows, page_size=page_size)
+        # what are the IDs corresponding to the names just entered?
+        curs.execute(select_sql, ([r[0] for r in rows],))
+        for name, item_id in curs.fetchall():
+            id_dict[name] = item_id
+            self._uncommitted.append((id_dict, name))
+        return
+
+    def warmup(self, sensors):
+        """Register all the sensors of the system up front.
+
+        Call this before the measurement loop; after that, storing a
+        measurement only looks up the sensor row id in a dictionary.
+        """
+        self.register_sensors(sensors)
+        return
@@ -70,14 +70,9 @@ db = PostgreSQLConnector(dbname="greenhouse2", \
                        password="thole-pippin-reborn-guppy")
 
 
-# Register the thermometers
-for therm in therm_list:
-    db.register_sensor(therm)
-
-# Register the switch sensors
+# Register the thermometers and the switch sensors all at once
 #  Modify this list according to the sensors in your system.
-db.register_sensor(sw1)
-db.register_sensor(sw2)
+db.warmup(therm_list + [sw1, sw2])
 
 # Read the sensors in the system every two seconds.
 try:
@@ -94,4 +89,5 @@ except KeyboardInterrupt:
     print("KeyboardInterrupt received\n   exiting...")
 finally:
     gpio_cleanup() # clean exit, reset the pins to inputs
+    db.close() # SQLite: write out buffered rows; PostgreSQL: nothing to do
 
@@ -0,0 +1,673 @@
+"""
+Test the measurement database connectors.
+"""
+
+import os
+import sqlite3
+import struct
+import sys
+import tempfile
+import types
+import unittest
+from unittest import mock
+from datetime import datetime
+from decimal import Decimal
+
+from database2 import DatabaseConnector, PostgreSQLConnector, _pg_copy_binary
+from greenhouse2 import Measurement
+
+
+class FakeSensor(object):
+    """
+    Sensor with a fixed name, type and units, no hardware.
+    """
+    def __init__(self, name, sensor_type, units):
+        self._name = name
+        self._type = sensor_type
+        self._units = units
+
+    def get_name(self):
+        return self._name
+
+    def get_type(self):
+        return self._type
+
+    def get_units(self):
+        return self._units
+
+
+class DatabaseConnectorTestCase(unittest.TestCase): # pylint: disable=R0904
+    """
+    database2.DatabaseConnector
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "measurement.db")
+        self.db = DatabaseConnector(self.path, batch_size=3)
+        self.sensors = [
+            FakeSensor("t1", "ds18b20", "C"),
+            FakeSensor("t2", "ds18b20", "C"),
+            FakeSensor("sw1", "switch", ""),
+        ]
+
+    def tearDown(self):
+        try:
+            self.db.close()
+        except sqlite3.ProgrammingError:
+            pass  # already closed by the test
+        self.tmpdir.cleanup()
+
+    def count_measurements(self):
+        """
+        Count rows through a separate connection, as another reader would.
+        """
+        conn = sqlite3.connect(self.path)
+        try:
+            return conn.execute("SELECT count(*) FROM measurement").fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_store_measurement_buffers_until_batch_size(self):
+        """
+        DatabaseConnector.store_measurement() writes batch_size at a time
+        """
+        self.db.warmup(self.sensors)
+        self.db.store_measurement(Measurement("t1", 1.0))
+        self.db.store_measurement(Measurement("t2", 2.0))
+        self.assertEqual(self.count_measurements(), 0)
+        self.db.store_measurement(Measurement("sw1", 1))
+        self.assertEqual(self.count_measurements(), 3)
+
+    def test_flush_and_close_write_remainder(self):
+        """
+        DatabaseConnector.flush() and close() write buffered measurements
+        """
+        self.db.warmup(self.sensors)
+        self.db.store_measurement(Measurement("t1", 1.0))
+        self.db.flush()
+        self.assertEqual(self.count_measurements(), 1)
+        self.db.store_measurement(Measurement("t2", 2.0))
+        self.db.close()
+        self.assertEqual(self.count_measurements(), 2)
+
+    def test_store_measurement_rejects_unknown_sensor(self):
+        """
+        DatabaseConnector.store_measurement() unknown sensor keeps the buffer
+        """
+        self.db.warmup(self.sensors)
+        self.db.store_measurement(Measurement("t1", 1.0))
+        self.db.store_measurement(Measurement("t2", 2.0))
+        with self.assertRaises(KeyError):
+            self.db.store_measurement(Measurement("nobody", 3.0))
+        self.db.store_measurement(Measurement("sw1", 1))
+        self.assertEqual(self.count_measurements(), 3)
+
+    def test_flush_keeps_buffer_on_failure(self):
+        """
+        DatabaseConnector.flush() failed write keeps the measurements
+        """
+        self.db.warmup(self.sensors)
+        self.db.store_measurement(Measurement("t1", 1.0))
+        self.db.store_measurement(Measurement("t2", 2.0))
+        # Another connection holds the write lock, so the flush fails
+        other = sqlite3.connect(self.path, timeout=0, isolation_level=None)
+        self.db._connection.execute("PRAGMA busy_timeout=0")
+        other.execute("BEGIN IMMEDIATE")
+        with self.assertRaises(sqlite3.OperationalError):
+            self.db.flush()
+        other.execute("ROLLBACK")
+        other.close()
+        self.assertEqual(self.count_measurements(), 0)
+        self.db.flush()
+        self.assertEqual(self.count_measurements(), 2)
+
+    def test_flush_drops_bad_batch(self):
+        """
+        DatabaseConnector.flush() rejected batch is dropped, not retried
+        """
+        self.db.warmup(self.sensors)
+        meas = Measurement("t1", 1.0)
+        self.db.store_measurement(meas)
+        self.db.store_measurement(meas)  # same sensor and time stamp
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.db.flush()
+        self.db.store_measurement(Measurement("t2", 2.0))
+        self.db.flush()
+        self.assertEqual(self.count_measurements(), 1)
+
+    def test_store_measurement_rejects_missing_value(self):
+        """
+        DatabaseConnector.store_measurement() rejects a None value at once
+        """
+        self.db.warmup(self.sensors)
+        with self.assertRaises(ValueError):
+            self.db.store_measurement(Measurement("t1", None))
+        self.db.store_measurement(Measurement("t2", 2.0))
+        self.db.flush()
+        self.assertEqual(self.count_measurements(), 1)
+
+    def test_flush_after_max_age(self):
+        """
+        DatabaseConnector.store_measurement() flushes once max_age passes
+        """
+        self.db.warmup(self.sensors)
+        with mock.patch("database2.time.monotonic",
+                        side_effect=[100.0, 105.0]):
+            self.db.store_measurement(Measurement("t1", 1.0))
+            self.db.store_measurement(Measurement("t2", 2.0))
+            self.assertEqual(self.count_measurements(), 0)
+        self.db.flush()
+        with mock.patch("database2.time.monotonic",
+                        side_effect=[200.0, 210.0]):
+            self.db.store_measurement(Measurement("t1", 3.0))
+            # Still under batch_size, but the first has waited 10 seconds
+            self.db.store_measurement(Measurement("t2", 4.0))
+            self.assertEqual(self.count_measurements(), 4)
+
+    def test_close_after_failed_flush(self):
+        """
+        DatabaseConnector.close() closes the connection if the flush fails
+        """
+        self.db.warmup(self.sensors)
+        meas = Measurement("t1", 1.0)
+        self.db.store_measurement(meas)
+        self.db.store_measurement(meas)
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.db.close()
+        with self.assertRaises(sqlite3.ProgrammingError):
+            self.db._connection.execute("SELECT 1")
+
+
+    def test_warmup_failure_forgets_ids(self):
+        """
+        DatabaseConnector.warmup() rolled back ids are not remembered
+        """
+        # A NULL type name violates NOT NULL after b's rows were inserted
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.db.warmup([FakeSensor("b", "newtype", "V"),
+                            FakeSensor("c", None, "V")])
+        self.assertEqual(self.db._sensors, {})
+        self.assertEqual(self.db._types, {})
+        self.assertEqual(self.db._units, {})
+
+        # SQLite hands out the rolled back ids again; b must not share x's id
+        self.db.register_sensor(FakeSensor("x", "other", "Pa"))
+        self.db.register_sensor(FakeSensor("b", "newtype", "V"))
+        self.assertNotEqual(self.db._sensors["b"], self.db._sensors["x"])
+        conn = sqlite3.connect(self.path)
+        try:
+            rows = conn.execute("SELECT name, id FROM sensor").fetchall()
+        finally:
+            conn.close()
+        self.assertEqual(dict(rows), self.db._sensors)
+
+
+    def test_register_sensor_failure_forgets_ids(self):
+        """
+        DatabaseConnector.register_sensor() rolled back units id is forgotten
+        """
+        # The units row is inserted, then the NULL type name fails
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.db.register_sensor(FakeSensor("b", None, "V"))
+        self.assertEqual(self.db._units, {})
+        self.assertFalse(self.db._connection.in_transaction)
+
+        self.db.register_sensor(FakeSensor("b", "newtype", "V"))
+        conn = sqlite3.connect(self.path)
+        try:
+            units = conn.execute("SELECT name, id FROM units").fetchall()
+        finally:
+            conn.close()
+        self.assertEqual(dict(units), self.db._units)
+
+
+    def test_store_measurements_epoch_time_stamps(self):
+        """
+        DatabaseConnector.store_measurements() integer epoch microseconds
+        """
+        self.db.warmup(self.sensors)
+        meas = Measurement("t1", 21.5)
+        meas._timestamp = datetime(2017, 3, 28, 12, 30, 15, 123456)
+        self.db.store_measurements([meas])
+        conn = sqlite3.connect(self.path)
+        try:
+            row = conn.execute("""SELECT timestamp,
+                strftime('%Y-%m-%d %H:%M:%f', timestamp / 1e6, 'unixepoch'),
+                sensor, value FROM measurement""").fetchone()
+        finally:
+            conn.close()
+        self.assertEqual(row, (1490704215123456, "2017-03-28 12:30:15.123",
+                               self.db._sensors["t1"], 21.5))
+
+    def test_store_measurements_unknown_sensor_writes_nothing(self):
+        """
+        DatabaseConnector.store_measurements() unknown sensor rolls back batch
+        """
+        self.db.warmup(self.sensors)
+        with self.assertRaises(KeyError):
+            self.db.store_measurements([Measurement("t1", 1.0),
+                                        Measurement("nobody", 2.0)])
+        self.assertFalse(self.db._connection.in_transaction)
+        self.assertEqual(self.count_measurements(), 0)
+
+    def test_wal_journal(self):
+        """
+        DatabaseConnector() opens the database in WAL mode
+        """
+        conn = sqlite3.connect(self.path)
+        try:
+            mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        finally:
+            conn.close()
+        self.assertEqual(mode, "wal")
+
+    def test_measurement_schema(self):
+        """
+        DatabaseConnector integer time stamp, (sensor, timestamp) key
+        """
+        conn = sqlite3.connect(self.path)
+        try:
+            columns = [(r[1], r[2], r[5]) for r in conn.execute(
+                "PRAGMA table_info(measurement)")]
+            sql = conn.execute("""SELECT sql FROM sqlite_master
+                WHERE name = 'measurement'""").fetchone()[0]
+        finally:
+            conn.close()
+        # (name, type, position in the primary key)
+        self.assertEqual(columns, [("timestamp", "INTEGER", 2),
+                                   ("sensor", "INTEGER", 1),
+                                   ("value", "REAL", 0)])
+        self.assertIn("WITHOUT ROWID", sql)
+
+    def test_create_database_tables(self):
+        """
+        DatabaseConnector() creates the four tables
+        """
+        conn = sqlite3.connect(self.path)
+        try:
+            tables = [r[0] for r in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'")]
+        finally:
+            conn.close()
+        self.assertEqual(sorted(tables),
+                         ["measurement", "sensor", "type", "units"])
+
+    def test_create_database_drops_existing_data(self):
+        """
+        DatabaseConnector() starts from empty tables
+        """
+        self.db.warmup(self.sensors)
+        self.db.store_measurements([Measurement("t1", 1.0)])
+        self.db.close()
+        self.db = DatabaseConnector(self.path)
+        conn = sqlite3.connect(self.path)
+        try:
+            self.assertEqual(
+                conn.execute("SELECT count(*) FROM sensor").fetchone()[0], 0)
+        finally:
+            conn.close()
+        self.assertEqual(self.count_measurements(), 0)
+
+    def test_upsert_returns_existing_ids(self):
+        """
+        DatabaseConnector.register_sensor() RETURNING id of existing rows
+        """
+        self.db.warmup(self.sensors)
+        expected = (dict(self.db._units), dict(self.db._types),
+                    dict(self.db._sensors))
+        self.assertEqual(expected[2], {"t1": 1, "t2": 2, "sw1": 3})
+        # Forget the remembered ids so the rows are upserted again
+        self.db._units.clear()
+        self.db._types.clear()
+        self.db._sensors.clear()
+        for sensor in reversed(self.sensors):
+            self.db.register_sensor(sensor)
+        self.assertEqual((self.db._units, self.db._types, self.db._sensors),
+                         expected)
+        conn = sqlite3.connect(self.path)
+        try:
+            self.assertEqual(
+                conn.execute("SELECT count(*) FROM sensor").fetchone()[0], 3)
+        finally:
+            conn.close()
+
+    def test_transaction_commit_and_rollback(self):
+        """
+        DatabaseConnector._transaction() commits, or rolls back on error
+        """
+        self.db.warmup(self.sensors)
+        sensor_id = self.db._sensors["t1"]
+        with self.db._transaction():
+            self.db._curs.execute("""INSERT INTO measurement
+                (timestamp, sensor, value) VALUES (1, ?, 1.0)""", (sensor_id,))
+        with self.assertRaises(ValueError):
+            with self.db._transaction():
+                self.db._curs.execute("""INSERT INTO measurement
+                    (timestamp, sensor, value) VALUES (2, ?, 2.0)""",
+                    (sensor_id,))
+                raise ValueError("abandon the transaction")
+        self.assertFalse(self.db._connection.in_transaction)
+        self.assertEqual(self.count_measurements(), 1)
+
+
+    def test_store_measurements_duck_typed(self):
+        """
+        DatabaseConnector.store_measurements() calls the measurement's methods
+        """
+        class FixedMeasurement(object):
+            def get_id(self):
+                return "t2"
+
+            def get_time(self):
+                return datetime(1970, 1, 1, 0, 0, 1)
+
+            def get_data(self):
+                return 4.5
+
+        self.db.warmup(self.sensors)
+        self.db.store_measurements([FixedMeasurement()])
+        conn = sqlite3.connect(self.path)
+        try:
+            row = conn.execute("SELECT * FROM measurement").fetchone()
+        finally:
+            conn.close()
+        self.assertEqual(row, (1000000, self.db._sensors["t2"], 4.5))
+
+
+class StubPGError(Exception):
+    """
+    psycopg2.Error stand-in carrying a SQLSTATE code.
+    """
+
+    def __init__(self, pgcode):
+        Exception.__init__(self, pgcode)
+        self.pgcode = pgcode
+
+
+class StubPGServer(object):
+    """
+    Committed rows shared by all the stub connections.
+    """
+
+    def __init__(self):
+        self.tables = {"units": {}, "type": {}, "sensor": {}}
+        self.measurements = []
+        self.copies = []
+        self.next_id = 1
+        self.fail_on = None  # statements containing this text fail
+
+
+class StubPGCursor(object):
+    """
+    Just enough of a psycopg2 cursor to run the connector's SQL.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, sql, params=None):
+        conn = self.connection
+        conn.log.append(sql.split()[0])
+        if conn.server.fail_on and conn.server.fail_on in sql:
+            raise StubPGError("23502")  # not_null_violation
+        if sql.startswith("PREPARE"):
+            conn.prepared = True
+        elif sql.startswith("EXECUTE"):
+            if not conn.prepared:
+                raise StubPGError("26000")
+            conn.new_measurements.append(params)
+        elif sql.startswith("INSERT INTO"):
+            table = sql.split()[2]
+            item_id = conn.lookup(table, params[0])
+            if item_id is None:
+                item_id = conn.server.next_id
+                conn.server.next_id += 1
+                conn.new_rows[table][params[0]] = item_id
+            self._rows = [(item_id,)]
+        elif sql.startswith("SELECT"):
+            table = sql.split()[4]
+            self._rows = [(name, conn.lookup(table, name)) for name in params[0]
+                          if conn.lookup(table, name) is not None]
+
+    def copy_expert(self, sql, stream):
+        self.connection.log.append(sql.split()[0])
+        self.connection.new_copies.append(stream.read())
+
+    def fetchone(self):
+        return self._rows[0]
+
+    def fetchall(self):
+        return list(self._rows)
+
+
+class StubPGConnection(object):
+    """
+    psycopg2 connection stand-in; uncommitted rows are kept apart.
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.closed = 0
+        self.prepared = False
+        self.log = []
+        self._discard()
+
+    def cursor(self):
+        return StubPGCursor(self)
+
+    def lookup(self, table, name):
+        if name in self.new_rows[table]:
+            return self.new_rows[table][name]
+        return self.server.tables[table].get(name)
+
+    def commit(self):
+        self.log.append("COMMIT")
+        for table, rows in self.new_rows.items():
+            self.server.tables[table].update(rows)
+        self.server.measurements.extend(self.new_measurements)
+        self.server.copies.extend(self.new_copies)
+        self._discard()
+
+    def rollback(self):
+        self.log.append("ROLLBACK")
+        self._discard()
+
+    def _discard(self):
+        self.new_rows = {table: {} for table in self.server.tables}
+        self.new_measurements = []
+        self.new_copies = []
+
+
+def stub_execute_batch(curs, sql, argslist, page_size=100):
+    """
+    psycopg2.extras.execute_batch() stand-in, one execute() per row.
+    """
+    for args in argslist:
+        curs.execute(sql, args)
+
+
+class StubPGPool(object):
+    """
+    ThreadedConnectionPool stand-in that runs out after maxconn connections.
+    """
+
+    def __init__(self, server, maxconn=2):
+        self.idle = [StubPGConnection(server) for _ in range(maxconn)]
+        self.in_use = []
+
+    def getconn(self):
+        if not self.idle:
+            raise StubPGError(None)  # psycopg2.pool.PoolError
+        conn = self.idle.pop()
+        self.in_use.append(conn)
+        return conn
+
+    def putconn(self, conn, close=False):
+        self.in_use.remove(conn)
+        if not close:
+            self.idle.append(conn)
+
+
+class PostgreSQLConnectorTestCase(unittest.TestCase): # pylint: disable=R0904
+    """
+    database2.PostgreSQLConnector against a stub connection pool
+    """
+
+    def setUp(self):
+        self.server = StubPGServer()
+        self.pool = StubPGPool(self.server)
+        psycopg2 = types.ModuleType("psycopg2")
+        psycopg2.Error = StubPGError
+        extras = types.ModuleType("psycopg2.extras")
+        extras.execute_batch = stub_execute_batch
+        psycopg2.extras = extras
+        modules = {"psycopg2": psycopg2, "psycopg2.extras": extras}
+        for patcher in (
+                mock.patch.dict(sys.modules, modules),
+                mock.patch("database2._get_pg_pool", return_value=self.pool)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.db = PostgreSQLConnector("greenhouse", "localhost", "pi", "pw")
+
+    def test_connection_returned_after_each_operation(self):
+        """
+        PostgreSQLConnector does not keep a pooled connection between calls
+        """
+        # More connectors than the pool has connections
+        connectors = [PostgreSQLConnector("greenhouse", "localhost", "pi", "pw")
+                      for _ in range(5)]
+        for db in connectors:
+            db.register_sensor(FakeSensor("t1", "ds18b20", "C"))
+            db.store_measurement(Measurement("t1", 1.0))
+            self.assertEqual(self.pool.in_use, [])
+        self.assertEqual(len(self.server.measurements), 5)
+
+    def test_connection_returned_on_failure(self):
+        """
+        PostgreSQLConnector gives a connection back after a failed statement
+        """
+        self.server.fail_on = "INSERT INTO sensor"
+        with self.assertRaises(StubPGError):
+            self.db.register_sensor(FakeSensor("t1", "ds18b20", "C"))
+        self.assertEqual(self.pool.in_use, [])
+        self.assertEqual(self.pool.idle[-1].log[-1], "ROLLBACK")
+        self.assertEqual(self.server.tables["units"], {})
+
+    def test_prepare_once_per_connection(self):
+        """
+        PostgreSQLConnector.store_measurement() prepares on first use only
+        """
+        self.db.register_sensor(FakeSensor("t1", "ds18b20", "C"))
+        conn = self.pool.idle[-1]
+        del conn.log[:]
+        self.db.store_measurement(Measurement("t1", 1.0))
+        self.db.store_measurement(Measurement("t1", 2.0))
+        self.assertEqual(conn.log, ["EXECUTE", "ROLLBACK", "PREPARE", "EXECUTE",
+                                    "COMMIT", "EXECUTE", "COMMIT"])
+        self.assertEqual([row[1:] for row in self.server.measurements],
+                         [(3, 1.0), (3, 2.0)])
+
+    def test_register_sensors_recalls_ids(self):
+        """
+        PostgreSQLConnector.register_sensors() reads ids back with ANY
+        """
+        self.server.tables["units"]["C"] = 50  # registered by another program
+        self.db.register_sensors([FakeSensor("t1", "ds18b20", "C"),
+                                  FakeSensor("t2", "ds18b20", "C"),
+                                  FakeSensor("sw1", "switch", "")])
+        conn = self.pool.idle[-1]
+        self.assertEqual(conn.log.count("SELECT"), 3)
+        self.assertEqual(self.db._units, self.server.tables["units"])
+        self.assertEqual(self.db._units["C"], 50)
+        self.assertEqual(self.db._types, self.server.tables["type"])
+        self.assertEqual(self.db._sensors, self.server.tables["sensor"])
+        self.assertEqual(sorted(self.db._sensors), ["sw1", "t1", "t2"])
+
+        # Known sensors are skipped without borrowing a connection
+        del conn.log[:]
+        self.db.register_sensors([FakeSensor("t1", "ds18b20", "C")])
+        self.assertEqual(conn.log, [])
+
+    def test_register_sensors_failure_forgets_ids(self):
+        """
+        PostgreSQLConnector.register_sensors() rolled back ids are forgotten
+        """
+        sensors = [FakeSensor("t1", "ds18b20", "C"),
+                   FakeSensor("sw1", "switch", "")]
+        self.server.fail_on = "INSERT INTO sensor"
+        with self.assertRaises(StubPGError):
+            self.db.register_sensors(sensors)
+        self.assertEqual(self.db._units, {})
+        self.assertEqual(self.db._types, {})
+        self.assertEqual(self.db._sensors, {})
+
+        self.server.fail_on = None
+        self.db.register_sensors(sensors)
+        self.assertEqual(self.db._units, self.server.tables["units"])
+        self.assertEqual(self.db._types, self.server.tables["type"])
+        self.assertEqual(self.db._sensors, self.server.tables["sensor"])
+
+    def test_copy_text_lines(self):
+        """
+        PostgreSQLConnector.store_measurements_bulk() text COPY lines
+        """
+        self.db.register_sensor(FakeSensor("t1", "ds18b20", "C"))
+        meas = [Measurement("t1", 21.5), Measurement("t1", Decimal("0.10")),
+                Measurement("t1", None)]
+        self.db.store_measurements_bulk(meas)
+        stamps = [m.get_timestamp() for m in meas]
+        self.assertEqual(self.server.copies, [
+            "{}\t3\t21.5\n{}\t3\t0.10\n{}\t3\t\\N\n".format(*stamps)])
+        self.assertEqual(self.pool.in_use, [])
+
+    def test_register_sensor_failure_forgets_ids(self):
+        """
+        PostgreSQLConnector.register_sensor() rolled back ids are forgotten
+        """
+        self.server.fail_on = "INSERT INTO sensor"
+        with self.assertRaises(StubPGError):
+            self.db.register_sensor(FakeSensor("t1", "ds18b20", "C"))
+        self.assertEqual(self.db._units, {})
+        self.assertEqual(self.db._types, {})
+
+
+class PGCopyBinaryTestCase(unittest.TestCase): # pylint: disable=R0904
+    """
+    database2._pg_copy_binary
+    """
+
+    def test_empty_stream(self):
+        """
+        _pg_copy_binary() header and trailer only
+        """
+        self.assertEqual(_pg_copy_binary([]),
+                         b"PGCOPY\n\xff\r\n\x00" + b"\x00" * 8 + b"\xff\xff")
+
+    def test_rows(self):
+        """
+        _pg_copy_binary() text time stamp, int4 sensor, float4 value
+        """
+        stream = _pg_copy_binary([("2017-03-28 12:30:15.123456", 7, 21.5),
+                                  ("2017-03-28 12:30:17", 8, -1)])
+        self.assertTrue(stream.startswith(b"PGCOPY\n\xff\r\n\x00"))
+        body = stream[19:]
+        self.assertEqual(body[:6], struct.pack("!hi", 3, 26))
+        self.assertEqual(body[6:32], b"2017-03-28 12:30:15.123456")
+        self.assertEqual(body[32:48], struct.pack("!iiif", 4, 7, 4, 21.5))
+        body = body[48:]
+        self.assertEqual(body[:6], struct.pack("!hi", 3, 19))
+        self.assertEqual(body[6:25], b"2017-03-28 12:30:17")
+        self.assertEqual(body[25:41], struct.pack("!iiif", 4, 8, 4, -1.0))
+        self.assertEqual(body[41:], b"\xff\xff")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -12,8 +12,14 @@ conn = sqlite3.Connection("measurement.db")
 # Get a cursor
 curs = conn.cursor()
 
+# Time stamps are stored as integer microseconds since the Unix epoch (UTC);
+# SQLite turns them back into readable dates only for display.
+EPOCH = datetime(1970, 1, 1)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
 print("20 most recent measurements")
-curs.execute("""SELECT sensor.name as s, measurement.timestamp as t, 
+curs.execute("""SELECT sensor.name as s,
+    strftime('%Y-%m-%d %H:%M:%f', measurement.timestamp / 1e6, 'unixepoch') as t,
     measurement.value as v, units.name as u
   FROM measurement, sensor, type, units
   WHERE measurement.sensor = sensor.id
@@ -33,13 +39,14 @@ current_time = datetime.utcnow()
 five_minutes = timedelta(minutes=5)
 earlier_time = current_time - five_minutes
 print("  from", earlier_time.isoformat(' '))
+earlier_us = (earlier_time - EPOCH) // ONE_MICROSECOND
 curs.execute("""SELECT sum(measurement.value), count(measurement.value),
     sum(measurement.value) / count(measurement.value)
   FROM measurement, sensor, type
   WHERE 
     measurement.sensor = sensor.id
     AND sensor.type = type.id AND type.name = 'ds18b20'
-    AND measurement.timestamp > %s;""", (earlier_time.isoformat(' '),))
+    AND measurement.timestamp > ?;""", (earlier_us,))
 row = curs.fetchone()
 if row[1] > 0:
     print("  sum",row[0], "count", row[1], "mean", row[2])